@@ -47,7 +47,9 @@ begin_template = '''<?xml version="1.0" encoding="UTF-8"?>
 # Templates for spots.
 allspots_template =     '    <AllSpots nspots="{nspots}">\n'
 inframe_template =      '     <SpotsInFrame frame="{frame}">\n'
-spot_template =         '        <Spot ID="{id}" name="{name} SPOT_{id}" VISIBILITY="1" RADIUS="10.0" QUALITY="-1.0" SOURCE_ID="0" POSITION_T="{frame}.0" POSITION_X="{x}" POSITION_Y="{y}" FRAME="{frame}" POSITION_Z="{z}" />\n'
+# Spot and edge templates are filled with % (called once per spot and edge).
+# Spot arguments: (id, name, id, frame, x, y, frame, z).
+spot_template =         '        <Spot ID="%s" name="%s SPOT_%s" VISIBILITY="1" RADIUS="10.0" QUALITY="-1.0" SOURCE_ID="0" POSITION_T="%s.0" POSITION_X="%s" POSITION_Y="%s" FRAME="%s" POSITION_Z="%s" />\n'
 inframe_end_template =  '     </SpotsInFrame>\n'
 allspots_end_template = '    </AllSpots>\n'
 inframe_empty_template = '     <SpotsInFrame frame="{frame}" />\n'
@@ -55,7 +57,8 @@ inframe_empty_template = '     <SpotsInFrame frame="{frame}" />\n'
 # Templates for tracks and edges.
 alltracks_template =        '    <AllTracks>\n'
 track_template =            '      <Track name="Track_{id}" TRACK_INDEX="{id}" TRACK_ID="{id}" TRACK_DURATION="{duration}.0" TRACK_START="0.0" TRACK_STOP="{stop}.0" TRACK_DISPLACEMENT="1.00000000000000" NUMBER_SPOTS="{nspots}" NUMBER_GAPS="0" LONGEST_GAP="0" NUMBER_SPLITS="0" NUMBER_MERGES="0" NUMBER_COMPLEX="0" DIVISION_TIME_MEAN="NaN" DIVISION_TIME_STD="NaN">\n'
-edge_template =             '        <Edge SPOT_SOURCE_ID="{source_id}" SPOT_TARGET_ID="{target_id}" LINK_COST="-1.0" VELOCITY="1.000000000000000" DISPLACEMENT="1.000000000000000" />\n'
+# Edge arguments: (source_id, target_id).
+edge_template =             '        <Edge SPOT_SOURCE_ID="%s" SPOT_TARGET_ID="%s" LINK_COST="-1.0" VELOCITY="1.000000000000000" DISPLACEMENT="1.000000000000000" />\n'
 track_end_template =        '      </Track>\n'
 alltracks_end_template =    '    </AllTracks>\n'
 
@@ -9,22 +9,97 @@ data can be analyzed by custom functions, or exported to different formats for
 data analyses in more up-to-date cell lineage software.
 '''
 
-from collections import OrderedDict
+import csv
+import mmap
+import re
+from array import array
+from io import StringIO
+from itertools import chain, islice
 from os.path import splitext
+from sys import intern
 
 # Constants.
 MATRIX_HEADER = 'embryo,quadrant,quartet,cell,frame,x,y,z,parent,fate\n'
-MATRIX_ROW = '{embryo},{quadrant},{quartet},{cell},{frame},{x},{y},{z},{parent},{fate}\n'
 IMAGE_WIDTH = 1376
 IMAGE_HEIGHT = 1040
+ENCODING = 'latin-1'
+BUFFER_SIZE = 1 << 16
+SBD_HEADER_LINES = 7
+SBD_DELIMITER = re.compile(br'\n---[^\n]*')
+QUARTET_LOWER = str.maketrans('abcd', 'qqqq')
+QUARTET_UPPER = str.maketrans('ABCD', 'QQQQ')
+
+
+def map_file(data_file):
+    '''Map an open file into memory for reading.
+
+    Falls back to reading the whole file when it cannot be mapped (e.g. when it
+    is empty). The mapping is released once it is no longer referenced.
+    '''
+    try:
+        return mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, mmap.error):
+        return data_file.read()
+
+
+def format_fields(*fields):
+    '''Format fields as one CSV line (without terminator).'''
+    buffer = StringIO()
+    csv.writer(buffer, lineterminator='').writerow(fields)
+    return buffer.getvalue()
+
+
+def iter_interpolation(coordinates, fraction=1.0):
+    '''Yield (index, frame, x, y, z) for every frame between spot coordinates.
+
+    coordinates is a sequence of (frame, x, y, z). index is the position of an
+    existing spot in it, or None for frames filled in by interpolation. The
+    last spot is only yielded when it is the only one.
+    '''
+    coordinates = list(coordinates)
+    # In case there is only one spot.
+    if len(coordinates) == 1:
+        yield (0, *coordinates[0])
+        return
+    # Make sure fraction is correct. Failsafe to 1.0.
+    if fraction > 1.0 or fraction <= 0.0:
+        fraction = 1.0
+
+    for index in range(len(coordinates) - 1):
+        # Yield existing spot.
+        frame, x, y, z = coordinates[index]
+        yield index, frame, x, y, z
+
+        # Get next spot.
+        next_frame, next_x, next_y, next_z = coordinates[index + 1]
+
+        # Calculate how many spots between spots (including first and last)
+        n_spots = next_frame - frame
+
+        # Continue if two spots are sequential.
+        if n_spots == 1:
+            continue
+
+        # Fraction to interpolate all=1.0, half=0.5
+        n_spots_fraction = n_spots * fraction
+
+        # Calculate interpolation values.
+        step_x = (next_x - float(x)) / n_spots_fraction
+        step_y = (next_y - float(y)) / n_spots_fraction
+        step_z = (next_z - float(z)) / n_spots_fraction
+
+        # Yield coordinates applying values.
+        for i in range(1, int(n_spots_fraction)):
+            yield (None, frame + i, int(x + step_x * i),
+                   int(y + step_y * i), int(z + step_z * i))
 
 
 class SimiProject:
     '''Simi BioCell project file.'''
-    def __init__(self, sbc_file, sbd_file):
+    def __init__(self, sbc_file, sbd_file, parse_spots=True):
         #TODO Decide upon dependency and which to load first.
         self.sbc = Sbc(sbc_file)
-        self.sbd = Sbd(sbd_file)
+        self.sbd = Sbd(sbd_file, parse_spots)
 
         # Declare reciprocal dependency. #FIXME
         self.sbc.sbd = self.sbd
@@ -45,54 +120,75 @@ class Sbc:
     def open_sbc(self, filepath):
         '''Save abspath and try to read file.'''
         try:
-            sbc_file = open(filepath, 'rU') # 'U' flag needed for Windows
+            sbc_file = open(filepath, 'rb', buffering=BUFFER_SIZE)
             return sbc_file
-        except:
+        except OSError:
             print('Could not load the file "{0}"'.format(filepath))
 
     def parse_sbc(self):
         '''Parse SBD information.'''
         # Stores the current setting.
         current_setting = u''
-        # Read SBC file line by line.
-        for line in self.sbc_file.readlines():
-            if line.startswith(';') or line.startswith('\n'):
+        # Read SBC file line by line, streaming from the file object.
+        for line in self.sbc_file:
+            line = line.rstrip(b'\r\n').decode(ENCODING)
+            if not line or line.startswith(';'):
                 continue
             else:
                 if line.startswith('['):
-                    current_setting = line.strip('[]\n')
+                    current_setting = line.strip('[]')
                     self.settings[current_setting] = {}
                 else:
                     splitted = line.split('=')
                     key = splitted[0]
-                    value = splitted[1].strip('\n')
+                    value = splitted[1]
                     self.settings[current_setting][key] = value
 
 
 
 class Sbd:
-    '''Database file for Simi BioCell.'''
-    def __init__(self, sbd_file):
+    '''Database file for Simi BioCell.
+
+    Set parse_spots to False to only load the lineage and the cell metadata
+    (including n_spots, last_frame and the first spot). Only the spot frames
+    are converted, the other coordinates are neither checked nor kept and
+    cells will have no spots. This is enough for write_matrix with
+    cell_matrix=True.
+    '''
+    def __init__(self, sbd_file, parse_spots=True):
         self.sbd_file = self.open_sbd(sbd_file)
+        self.parse_spots = parse_spots
 
         # Main dictionary with all cells.
-        self.cells = OrderedDict()
+        self.cells = {}
+
+        # List of all parsed cells in file order. Unlike cells, it also keeps
+        # records whose generic name is reused by a later record.
+        self.all_cells = []
 
         # Main dictionary with valid cells.
-        self.valid_cells = OrderedDict()
+        self.valid_cells = {}
 
         # Dictionary for invalid cells (=without spots).
-        self.invalid_cells = OrderedDict()
+        self.invalid_cells = {}
+
+        # Dictionary for cells without parent.
+        self.root_cells = {}
 
         # Last frame of the recording.
         self.last_frame = 0  # TODO: get from sbc?
 
+        # Index of the parent of each cell (-1 for cells without parent).
+        self.parent_index = array('i')
+
         # Parse file.
         self.parse_sbd()
 
         # Generate descendants.
-        for name, cell in self.cells.iteritems():
-            cell.get_descendants()
+        self.build_descendants()
+
+        # Generate parent index.
+        self.build_parent_index()
 
     def __str__(self):
         return self.sbd_file.name
@@ -105,143 +201,230 @@ class Sbd:
     def open_sbd(self, filepath):
         '''Get user input, save abspath and try to read file.'''
         try:
-            sbd_file = open(filepath, 'rU')
+            sbd_file = open(filepath, 'rb')
             return sbd_file
-        except:
+        except OSError:
             print('Could not load the file "{0}"'.format(filepath))
 
     def parse_sbd(self):
         '''Parse SBD information.'''
-        # Temporary buffer for each line of a cell record.
-        tmp_cell = ''
         # Temporary switches for parenthood.
         has_parent = False
         parent_cell = None
         # Store for generation birth time of right sibling cell.
         sister_cells = {}
+        # Local references used for every record.
+        cells = self.cells
+        all_cells = self.all_cells
+        root_cells = self.root_cells
+        valid_cells = self.valid_cells
+        invalid_cells = self.invalid_cells
+        parse_spots = self.parse_spots
+
+        # Map SBD file into memory and iterate over its cell records.
+        data = map_file(self.sbd_file)
+        for record in self.iter_records(data):
+            if record and not record.isspace():
+                # Create cell instance with raw data.
+                cell = Cell(record.decode(ENCODING), parse_spots)
+                cell.sbd = self
+
+                # if cell.generic_name == '4CA':
+                    # import pdb; pdb.set_trace()
+
+                # Define parent cell.
+                if has_parent:
+                    cell.parent = parent_cell
+                    cell.parent.add_daughter(cell)
+                else:
+                    # If cell has a parent, but it's upstream in the lineage.
+                    sister_cell = sister_cells.get(cell.generation_birth_time)
+                    if sister_cell is not None:
+                        # TODO Sometimes this fails. The generation birth is not correct. See 4CA cell and its false 3d1 parent in embryo wt2.
+                        # Get common parent of sibling cells.
+                        common_parent = sister_cell.parent
+                        cell.parent = common_parent
+                        cell.parent.add_daughter(cell)
+
+                # If cell has a left daughter, turn switch on and define parent.
+                if cell.cells_left == 1:
+                    has_parent = True
+                    parent_cell = cell
+                elif cell.cells_left == 0:
+                    has_parent = False
+                    parent_cell = None
+
+                # If cell has a right daughter, add to the sibling dictionary.
+                if cell.cells_right == 1:
+                    sister_cells[cell.generation_birth_time] = cell
+
+                # Add cell to main dictionary and list.
+                cells[cell.generic_name] = cell
+                all_cells.append(cell)
+
+                # Keep track of cells without parent.
+                if cell.parent is None:
+                    root_cells[cell.generic_name] = cell
+                else:
+                    root_cells.pop(cell.generic_name, None)
 
-        # Read SBD file line by line.
-        for line in self.sbd_file.readlines()[7:]:  # skip headers
-            if line.startswith('---'):
-                if tmp_cell:
-                    # Create cell instance with raw data.
-                    cell = Cell(tmp_cell)
-                    cell.sbd = self
-
-                    # if cell.generic_name == '4CA':
-                        # import pdb; pdb.set_trace()
-
-                    # Define parent cell.
-                    if has_parent:
-                        cell.parent = parent_cell
-                        cell.parent.daughters.append(cell)
-                    else:
-                        # If cell has a parent, but it's upstream in the lineage.
-                        if cell.generation_birth_time in sister_cells.keys():
-                            # TODO Sometimes this fails. The generation birth is not correct. See 4CA cell and its false 3d1 parent in embryo wt2.
-                            # Get common parent of sibling cells.
-                            common_parent = sister_cells[cell.generation_birth_time].parent
-                            cell.parent = common_parent
-                            cell.parent.daughters.append(cell)
-
-                    # If cell has a left daughter, turn switch on and define parent.
-                    if cell.cells_left == 1:
-                        has_parent = True
-                        parent_cell = cell
-                    elif cell.cells_left == 0:
-                        has_parent = False
-                        parent_cell = None
-
-                    # If cell has a right daughter, add to the sibling dictionary.
-                    if cell.cells_right == 1:
-                        sister_cells[cell.generation_birth_time] = cell
-
-                    # Add cell to main dictionary.
-                    self.cells[cell.generic_name] = cell
-
-                    # If cell is valid, add it to list.
-                    if cell.valid:
-                        self.valid_cells[cell.generic_name] = cell
-                        self.update_last_frame(cell)
-                    else:
-                        self.invalid_cells[cell.generic_name] = cell
-
-                    # Clean temporary cell.
-                    tmp_cell = ''
-            else:
-                # Add next line to cell data.
-                tmp_cell = tmp_cell + line
+                # If cell is valid, add it to list.
+                if cell.valid:
+                    valid_cells[cell.generic_name] = cell
+                    self.update_last_frame(cell)
+                else:
+                    invalid_cells[cell.generic_name] = cell
+
+    def iter_records(self, data):
+        '''Yield the raw cell records of SBD data, skipping the headers.'''
+        start = 0
+        for i in range(SBD_HEADER_LINES):
+            start = data.find(b'\n', start) + 1
+        # Records are separated by delimiter lines ("---").
+        for delimiter in SBD_DELIMITER.finditer(data, start - 1):
+            yield data[start:delimiter.start()]
+            start = delimiter.end() + 1
+        # Last record without a closing delimiter.
+        yield data[start:]
 
     def update_last_frame(self, cell):
         '''Updates the last_frame value for the simi instance.'''
-        if cell.last_frame > self.last_frame:
-            self.last_frame = cell.last_frame
+        self.last_frame = max(self.last_frame, cell.last_frame)
+
+    def build_descendants(self):
+        '''Populate the descendants of all cells in a single pass.
+
+        Cells are visited depth-first using an explicit stack. The descendants
+        of a cell are assembled from those of its daughters once all of them
+        are done, so every subtree is only walked once.
+        '''
+        done = set()
+        for root in self.all_cells:
+            stack = [root]
+            while stack:
+                cell = stack[-1]
+                pending = [child for child in cell.daughters if child not in done]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+                if cell in done:
+                    continue
+                if cell.daughters and cell.descendants is None:
+                    cell.descendants = {}
+                for child in cell.daughters:
+                    cell.descendants[child.generic_name] = child
+                    if child.descendants:
+                        cell.descendants.update(child.descendants)
+                done.add(cell)
+
+    def build_parent_index(self):
+        '''Number all cells and store the index of their parents.
+
+        Cells are numbered following the order of self.all_cells, so cells
+        whose generic name is shadowed in self.cells are numbered too. The
+        lineage is then represented by the parent_index array, where the item
+        at a cell's index is the index of its parent, or -1 if the cell has no
+        parent.
+        '''
+        for index, cell in enumerate(self.all_cells):
+            cell.index = index
+        self.parent_index = array('i', [-1]) * len(self.all_cells)
+        for cell in self.all_cells:
+            if cell.parent is not None:
+                self.parent_index[cell.index] = cell.parent.index
+
+    def walk_ancestors(self, indices, steps):
+        '''Walk up the lineage from several cells at once.
+
+        Returns a list with one row of cell indices per step, beginning with
+        the given indices. Walks that pass the root of the lineage stay at -1.
+        '''
+        parent_index = self.parent_index
+        walk = [list(indices)]
+        for step in range(steps):
+            walk.append([parent_index[i] if i >= 0 else -1 for i in walk[-1]])
+        return walk
 
     def get_cells_without_parent(self):
         '''Returns a list of valid cells that have no parent.'''
-        no_parent = []
-        for cell in self.list_of_cells:
-            if not cell.parent:
-                no_parent.append(cell)
-        return no_parent
+        return [cell for cell in self.root_cells.values() if cell.valid]
 
     def write_matrix(self, outfile, cell_matrix=False):
-        '''Output flat matrix files with all cells.'''
-        # First, get calibration factor.
+        '''Output flat matrix files with all cells.
+
+        Writing all spots (cell_matrix=False) needs the spots to be parsed.
+        '''
+        if not cell_matrix and not self.parse_spots:
+            raise ValueError('Spots were not parsed, only cell_matrix=True '
+                             'can be written.')
+        # First, get calibration factor and embryo name.
         calibration = self.get_calibration_factor()
+        embryo = splitext(self.sbd_file.name)[0]
 
         # Start writing to file.
-        matrix = open(outfile, 'w')
-        # Write header.
-        matrix.write(MATRIX_HEADER)
-        # Iterate over each cell.
-        for cell_key, cell in self.cells.items():
-            # Only capture valid cells.
-            if cell.valid:
-                quadrant = cell.get_quadrant()
-                quartet = cell.get_quartet()
-                embryo = splitext(cell.sbd.sbd_file.name)[0]
-                if cell.parent:
-                    parent = cell.parent.generic_name
-                else:
-                    parent = ''
-                # Write a cell matrix (only use coordinates from first spot).
-                if cell_matrix:
-                    first_spot = cell.spots[0]
-                    matrix.write(MATRIX_ROW.format(
-                        embryo=embryo,
-                        quadrant=quadrant,
-                        quartet=quartet,
-                        cell=cell.generic_name,
-                        frame=cell.birth_frame,
-                        x=first_spot.x * calibration,
-                        y=first_spot.y * calibration,
-                        z=first_spot.z,
-                        parent=parent,
-                        fate=cell.wildtype,
-                        ))
-                else:
-                    # Write matrix for all spots.
-                    for spot in cell.spots:
-                        matrix.write(MATRIX_ROW.format(
-                            embryo=embryo,
-                            quadrant=quadrant,
-                            quartet=quartet,
-                            cell=cell.generic_name,
-                            frame=spot.frame,
-                            x=spot.x * calibration,
-                            y=spot.y * calibration,
-                            z=spot.z,
-                            parent=parent,
-                            fate=cell.wildtype,
+        with open(outfile, 'w', buffering=BUFFER_SIZE) as matrix:
+            writer = csv.writer(matrix, lineterminator='\n')
+            # Write header.
+            matrix.write(MATRIX_HEADER)
+            # Iterate over each cell.
+            for cell_key, cell in self.cells.items():
+                # Only capture valid cells.
+                if cell.valid:
+                    quadrant = cell.get_quadrant()
+                    quartet = cell.get_quartet()
+                    if cell.parent:
+                        parent = cell.parent.generic_name
+                    else:
+                        parent = ''
+                    # Write a cell matrix (only use coordinates from first spot).
+                    if cell_matrix:
+                        frame, x, y, z = cell.get_first_spot_coordinates()
+                        writer.writerow((
+                            embryo, quadrant, quartet, cell.generic_name,
+                            cell.birth_frame,
+                            x * calibration,
+                            y * calibration,
+                            z,
+                            parent, cell.wildtype,
                             ))
-        matrix.close()
+                    else:
+                        # Write matrix for all spots. Fields that are the
+                        # same for every spot are formatted once per cell.
+                        prefix = format_fields(
+                            embryo, quadrant, quartet, cell.generic_name, '')
+                        suffix = format_fields('', parent, cell.wildtype) + '\n'
+                        matrix.writelines([
+                            f'{prefix}{frame},{x * calibration},'
+                            f'{y * calibration},{z}{suffix}'
+                            for frame, x, y, z in cell.get_spot_coordinates()])
 
 
 class Cell:
-    '''Store all cell-related information'''
-    def __init__(self, raw_data):
-        self.raw_data = raw_data
+    '''Store all cell-related information.
+
+    Attributes are declared in __slots__, so new ones cannot be attached to
+    instances; keep extra per-cell data in a dictionary keyed by cell.
+    '''
+    __slots__ = (
+        'sbd', 'sbc', 'valid',
+        # Line 1.
+        'cells_left', 'cells_right', 'active_cells_left',
+        'active_cells_right', 'generic_name',
+        # Line 2.
+        'generation_birth_time', 'generation_level', 'generation_wildtype',
+        'generation_color', 'generation_name',
+        # Line 3.
+        'birth_frame', 'birth_level', 'wildtype', 'size', 'shape', 'color',
+        'name',
+        # Line 4 and spots.
+        'n_spots', 'comment', 'spot_frames', 'spot_x', 'spot_y', 'spot_z',
+        '_spots', '_first_spot',
+        # Additional and traverse attributes.
+        'index', 'last_frame', 'parent', 'daughters', 'descendants',
+        )
+
+    def __init__(self, raw_data, parse_spots=True):
         self.sbd = None
         self.sbc = None  # TODO: not defined yet.
         self.valid = False
@@ -275,108 +458,74 @@ class Cell:
         self.n_spots = None
         self.comment = u''
 
-        # Cell attributes line 5 and beyond: please see class Spot. Spots are
-        # stored in a list.
-        self.spots = []
+        # Cell attributes line 5 and beyond: please see class Spot. Spot
+        # coordinates are stored column-wise (one array per dimension). The
+        # list of Spot instances is only created when accessed (see spots).
+        self.spot_frames = array('i')
+        self.spot_x = array('i')
+        self.spot_y = array('i')
+        self.spot_z = array('i')
+        self._spots = None
+        # Only set when spots are not parsed, see get_first_spot_coordinates.
+        self._first_spot = None
 
         # Additional attributes.
+        self.index = None  # position in Sbd.all_cells, see Sbd.parent_index
         self.last_frame = -1
         self.parent = None
-        self.daughters = []
+        self.daughters = ()  # list created by add_daughter()
 
-        # Traverse values.
-        self.parents = {}
-        self.descendants = {}
+        # Traverse values. Only created when needed.
+        self.descendants = None
 
-        # Parse data, any error returns False (invalid).
-        self.valid = self.parse_data()
+        # Parse data, any error returns False (invalid). The raw data is not
+        # kept after parsing.
+        self.valid = self.parse_data(raw_data, parse_spots)
 
     def __str__(self):
         return 'CELL={name}'.format(name=self.generic_name)
 
-    def parse_data(self):
-        '''Extract attributes from raw data.'''
-        split_lines = self.raw_data.split('\n')
-
-        # Line one values.
-        try:
-            line_one = split_lines[0]
-            line_one_split = line_one.split()
-            # Loop to capture values.
-            for index, value in enumerate(line_one_split):
-                if index == 0:
-                    self.cells_left = int(value)
-                elif index == 1:
-                    self.cells_right = int(value)
-                elif index == 2:
-                    self.active_cells_left = int(value)
-                elif index == 3:
-                    self.active_cells_right = int(value)
-                elif index == 4:
-                    self.generic_name = value
-        except:
-            print('Error parsing line 1!')
-            print(self.raw_data)
-            return False
-
-        # Line two values.
-        try:
-            line_two = split_lines[1]
-            line_two_split = line_two.split()
-            # Loop to capture values.
-            for index, value in enumerate(line_two_split):
-                if index == 0:
-                    self.generation_birth_time = int(value)
-                elif index == 1:
-                    self.generation_level = int(value)
-                elif index == 2:
-                    self.generation_wildtype = int(value)
-                elif index == 3:
-                    self.generation_color = int(value)
-                elif index == 4:
-                    self.generation_name = value
-        except:
-            print('Error parsing line 2!')
-            print(self.raw_data)
-            return False
+    def parse_data(self, raw_data, parse_spots=True):
+        '''Extract attributes from raw data.
 
-        # Line three values.
-        try:
-            line_three = split_lines[2]
-            line_three_split = line_three.split()
-            # Loop to capture values.
-            for index, value in enumerate(line_three_split):
-                if index == 0:
-                    self.birth_frame = int(value)
-                elif index == 1:
-                    self.birth_level = int(value)
-                elif index == 2:
-                    self.wildtype = int(value)
-                elif index == 3:
-                    self.size = int(value)
-                elif index == 4:
-                    self.shape = int(value)
-                elif index == 5:
-                    self.color = int(value)
-                elif index == 6:
-                    self.name = value
-        except:
-            print('Error parsing line 3!')
-            print(self.raw_data)
-            return False
+        If parse_spots is False, only the frames and the first spot are
+        converted; the frames give the last frame and the first spot is kept
+        for get_first_spot_coordinates. Other coordinates are not checked.
+        '''
+        split_lines = raw_data.split('\n')
+        # Bind int locally to skip the global lookup on every conversion.
+        _int = int
 
-        # Line four values.
         try:
-            line_four = split_lines[3]
-            line_four_split = line_four.split()
-            # Define variables.
-            self.n_spots = int(line_four_split[0])
-            # Remove first item to join comment string.
-            line_four_split.pop(0)
-            self.comment = ' '.join(line_four_split)
-        except:
-            print('Error parsing line 4!')
-            print(self.raw_data)
+            # Line one values.
+            line_one = split_lines[0].split()
+            (self.cells_left, self.cells_right, self.active_cells_left,
+             self.active_cells_right) = map(_int, line_one[:4])
+            if len(line_one) > 4:
+                self.generic_name = intern(line_one[4])
+
+            # Line two values.
+            line_two = split_lines[1].split()
+            (self.generation_birth_time, self.generation_level,
+             self.generation_wildtype, self.generation_color) = map(_int, line_two[:4])
+            if len(line_two) > 4:
+                self.generation_name = line_two[4]
+
+            # Line three values.
+            line_three = split_lines[2].split()
+            (self.birth_frame, self.birth_level, self.wildtype, self.size,
+             self.shape, self.color) = map(_int, line_three[:6])
+            if len(line_three) > 6:
+                self.name = intern(line_three[6])
+
+            # Line four values.
+            n_spots, *comment = split_lines[3].split()
+            self.n_spots = _int(n_spots)
+            # Join the remaining items into the comment string.
+            self.comment = ' '.join(comment)
+        except (ValueError, IndexError):
+            print('Error parsing cell data!')
+            print(raw_data)
             return False
 
         # If there are no spots, invalid cell.
@@ -385,15 +534,89 @@ class Cell:
         else:
             # Get the list index of the last spot in split_lines.
             last_spot_index = 4 + self.n_spots
-            # Use the index to add the exact number of spots.
-            for spot_line in split_lines[4:last_spot_index]:
-                new_spot = Spot(spot_line)
-                new_spot.cell = self
-                self.spots.append(new_spot)
-                self.update_last_frame(new_spot)
+            # Use the index to get the frame, x, y, z of the exact number of
+            # spots. All the spots declared on line four must be present.
+            rows = [line.split()[:4] for line in islice(split_lines, 4, last_spot_index)]
+            if len(rows) != self.n_spots:
+                print('Error parsing spot data!')
+                print(raw_data)
+                return False
+            try:
+                if parse_spots:
+                    # Convert all values at once.
+                    values = array('i', map(_int, chain.from_iterable(rows)))
+                    if len(values) != 4 * len(rows):
+                        raise ValueError
+                else:
+                    # Only convert the frames and the first spot.
+                    if any(len(row) != 4 for row in rows):
+                        raise ValueError
+                    frames = array('i', [_int(row[0]) for row in rows])
+                    first_spot = tuple(map(_int, rows[0]))
+            except ValueError:
+                print('Error parsing spot data!')
+                print(raw_data)
+                return False
+            if not parse_spots:
+                self._first_spot = first_spot
+                self.last_frame = max(frames)
+                return True
+            # Split values into columns.
+            self.spot_frames = values[0::4]
+            self.spot_x = values[1::4]
+            self.spot_y = values[2::4]
+            self.spot_z = values[3::4]
+            # Last frame is the maximum of all spot frames.
+            if self.spot_frames:
+                self.last_frame = max(self.spot_frames)
             # Change status to valid.
             return True
 
+    @property
+    def spots(self):
+        '''List of spots of the cell.
+
+        Spot instances are created from the spot columns on first access and
+        kept, so changes to them (or to the list) persist.
+        '''
+        if self._spots is None:
+            # The number of spots is known, create the list at full size.
+            spots = [None] * len(self.spot_frames)
+            for index, (frame, x, y, z) in enumerate(self.get_spot_coordinates()):
+                new_spot = Spot(parse=False)
+                new_spot.cell = self
+                new_spot.frame = frame
+                new_spot.x = x
+                new_spot.y = y
+                new_spot.z = z
+                new_spot.valid = bool(frame)
+                spots[index] = new_spot
+            self._spots = spots
+        return self._spots
+
+    @spots.setter
+    def spots(self, spots):
+        self._spots = spots
+
+    def get_spot_coordinates(self):
+        '''Returns an iterable of (frame, x, y, z) for all spots.
+
+        Reads straight from the spot columns unless the Spot instances were
+        already created, in which case they are used to reflect any changes.
+        '''
+        if self._spots is None:
+            return zip(self.spot_frames, self.spot_x, self.spot_y, self.spot_z)
+        return [(spot.frame, spot.x, spot.y, spot.z) for spot in self._spots]
+
+    def get_first_spot_coordinates(self):
+        '''Returns (frame, x, y, z) of the first spot or None without spots.
+
+        Also available when the spots were not parsed.
+        '''
+        if self._first_spot is not None:
+            return self._first_spot
+        return next(iter(self.get_spot_coordinates()), None)
+
     def get_fate(self):
         '''Get textual definition of the cell fate.'''
         fate_id = self.wildtype
@@ -409,15 +632,24 @@ class Cell:
         if spot.frame > self.last_frame:
             self.last_frame = spot.frame
 
+    def add_daughter(self, cell):
+        '''Add a daughter cell, creating the list of daughters if needed.'''
+        if not self.daughters:
+            self.daughters = []
+        self.daughters.append(cell)
+
     def get_descendants(self):
         '''Returns the descendants.
 
         This function calculates the descendants for all the descendants
-        recursively.  It can be used as an initial method to populate the
-        descendants or to get the current descendants of a cell.
+        recursively.  The result is cached, so only the first call (or
+        Sbd.build_descendants) walks the tree.
 
         A dictionary is returned.
         '''
+        if self.descendants is not None:
+            return self.descendants
+        self.descendants = {}
         # Iterate through daughter cells.
         for child in self.daughters:
             # Add child to dictionary.
@@ -447,111 +679,101 @@ class Cell:
         cell = self.generic_name
         if cell == 'AB' or cell == 'CD':
             return ''
-        quartet = ''
-        if self.generic_name.islower():
-            return cell.replace('a', 'q').replace('b', 'q').replace('c', 'q').replace('d', 'q')
-        elif self.generic_name.isupper():
-            return cell.replace('A', 'Q').replace('B', 'Q').replace('C', 'Q').replace('D', 'Q')
+        if cell.islower():
+            return cell.translate(QUARTET_LOWER)
+        elif cell.isupper():
+            return cell.translate(QUARTET_UPPER)
         else:
             return ''
 
     def interpolate_spots(self, fraction=1.0):
-        '''Interpolate spots to cover every frame.'''
+        '''Interpolate spots to cover every frame.
+
+        Appends a spot before division to the cell (see
+        append_spot_before_division) and returns a new list with the existing
+        and interpolated spots.
+        '''
         # Append spot before division.
-        if self.daughters:
-            validity = [d.valid for d in self.daughters]
-            if not False in validity:
-                self.append_spot_before_division()
-        # In case there is only one spot.
-        if len(self.spots) == 1:
-            return self.spots
-        # Make sure fraction is correct. Failsafe to 1.0.
-        if fraction > 1.0 or fraction <= 0.0:
-            fraction = 1.0
-        # Local list of spots and interpolated.
+        self.append_spot_before_division()
         spots = self.spots
         interpolated = []
-
-        for index, spot in enumerate(spots):
-            if index == len(spots) - 1:
+        for index, frame, x, y, z in iter_interpolation(self.get_spot_coordinates(), fraction):
+            # Only interpolated frames need a new spot.
+            if index is not None:
+                interpolated.append(spots[index])
                 continue
-
-            # Add spot to list.
-            interpolated.append(spot)
-
-            # Get next spot.
-            next_spot = spots[index + 1]
-
-            # Calculate how many spots between spots (including first and last)
-            n_spots = next_spot.frame - spot.frame
-
-            # Continue if two spots are sequential.
-            if n_spots == 1:
-                continue
-
-            # Fraction to interpolate all=1.0, half=0.5
-            n_spots_fraction = n_spots * fraction
-
-            # Calculate interpolation values.
-            step_x = (next_spot.x - float(spot.x)) / n_spots_fraction
-            step_y = (next_spot.y - float(spot.y)) / n_spots_fraction
-            step_z = (next_spot.z - float(spot.z)) / n_spots_fraction
-
-            # Create spots applying values.
-            for i in range(1, int(n_spots_fraction)):
-                new_spot = Spot(parse=False)
-                new_spot.cell = self
-                new_spot.frame = spot.frame + i
-                new_spot.x = int(spot.x + step_x * i)
-                new_spot.y = int(spot.y + step_y * i)
-                new_spot.z = int(spot.z + step_z * i)
-                new_spot.valid = True
-                interpolated.append(new_spot)
-
-        # Return complete list with interpolated spots.
+            new_spot = Spot(parse=False)
+            new_spot.cell = self
+            new_spot.frame = frame
+            new_spot.x = x
+            new_spot.y = y
+            new_spot.z = z
+            new_spot.valid = True
+            interpolated.append(new_spot)
         return interpolated
 
-    def append_spot_before_division(self):
-        '''Add spots until cell division.'''
-        last_spot = self.spots[-1]
-        left_child = self.daughters[0].spots[0]
-        sum_x = [last_spot.x, left_child.x]
-        sum_y = [last_spot.y, left_child.y]
-        sum_z = [last_spot.z, left_child.z]
-        n = 2
-
-        # If there are two daughters.
+    def interpolate_coordinates(self, fraction=1.0):
+        '''Interpolate spot coordinates to cover every frame.
+
+        Same as interpolate_spots, but returns (frame, x, y, z) tuples read from
+        the spot columns. No Spot instances are created and the cell is not
+        changed: the spot before division is only included in the result.
+        '''
+        coordinates = list(self.get_spot_coordinates())
+        division = self.get_division_coordinates()
+        if division is not None:
+            coordinates.append(division)
+        return [item[1:] for item in iter_interpolation(coordinates, fraction)]
+
+    def get_division_coordinates(self):
+        '''Returns (frame, x, y, z) of a spot right before division, or None.
+
+        The spot is one frame before the first spot of the left daughter, at
+        the average position of the last spot of the cell and the first spot of
+        the daughters. None if not all daughters are valid, or if the cell
+        already has a spot at that frame.
+        '''
+        if not self.daughters or False in [d.valid for d in self.daughters]:
+            return None
+        coordinates = list(self.get_spot_coordinates())
+        if not coordinates:
+            return None
+        last_spot = coordinates[-1]
+        # Only use the right daughter if there are two daughters.
         if len(self.daughters) == 2:
-            right_child = self.daughters[1].spots[0]
-            sum_x.append(right_child.x)
-            sum_y.append(right_child.y)
-            sum_z.append(right_child.z)
-            n = 3
+            daughters = self.daughters
+        else:
+            daughters = self.daughters[:1]
+        points = [last_spot]
+        points.extend(next(iter(d.get_spot_coordinates())) for d in daughters)
+        n = len(points)
 
         # Calculate the coordinates.
-        new_frame = left_child.frame - 1
-        new_x = sum(sum_x) / n
-        new_y = sum(sum_y) / n
-        new_z = sum(sum_z) / n
+        new_frame = points[1][0] - 1
+        new_x = sum(point[1] for point in points) // n
+        new_y = sum(point[2] for point in points) // n
+        new_z = sum(point[3] for point in points) // n
 
         # Abort if spot at the same frame already exists.
-        if new_frame == last_spot.frame:
-            pass
-        else:
+        if new_frame == last_spot[0]:
+            return None
+        return new_frame, new_x, new_y, new_z
+
+    def append_spot_before_division(self):
+        '''Add spots until cell division.'''
+        division = self.get_division_coordinates()
+        if division is not None:
             # Define new spot.
             new_spot = Spot(parse=False)
             new_spot.cell = self
-            new_spot.frame = new_frame
-            new_spot.x = new_x
-            new_spot.y = new_y
-            new_spot.z = new_z
+            new_spot.frame, new_spot.x, new_spot.y, new_spot.z = division
             new_spot.valid = True
 
             # Append spot to spot list.
             self.spots.append(new_spot)
 
             # Updates cell's last frame.
-            self.last_frame = new_frame
+            self.last_frame = new_spot.frame
 
     def print_data(self):
         '''Print out cell data.'''
@@ -563,9 +785,16 @@ class Cell:
 
 
 class Spot:
-    '''A spot is a manually tracked point with x, y, z, t dimensions.'''
+    '''A spot is a manually tracked point with x, y, z, t dimensions.
+
+    Attributes are declared in __slots__, so new ones cannot be attached to
+    instances.
+    '''
+    __slots__ = (
+        'cell', 'valid', 'frame', 'x', 'y', 'z', 'time',
+        )
+
     def __init__(self, raw_data='', parse=True):
-        self.raw_data = raw_data
         self.cell = None
         self.valid = False
 
@@ -580,21 +809,22 @@ class Spot:
 
         # Parse and validate data.
         if parse:
-            self.valid = self.parse_data()
+            self.valid = self.parse_data(raw_data)
 
     def __str__(self):
         return 'CELL={cell} FRAME={frame} X={x} Y={y} Z={z}'.format(
                 cell=self.cell.generic_name, frame=self.frame, x=self.x, y=self.y, z=self.z)
 
-    def parse_data(self):
+    def parse_data(self, raw_data):
         '''Parse spot coordinates.'''
-        coordinates = self.raw_data.split()
+        # Only the first four values are frame and coordinates.
+        frame, x, y, z = raw_data.split()[:4]
 
         # Get attributes.
-        self.frame = int(coordinates[0])
-        self.x = int(coordinates[1])
-        self.y = int(coordinates[2])
-        self.z = int(coordinates[3])
+        self.frame = int(frame)
+        self.x = int(x)
+        self.y = int(y)
+        self.z = int(z)
 
         if self.frame:
             return True
@@ -2,6 +2,7 @@
 
 import argparse
 import simi
+from collections import defaultdict
 from os.path import splitext
 from mamut_xml_templates import *
 
@@ -9,7 +10,7 @@ from mamut_xml_templates import *
 
 Attention! This script is an example to be used as a template. It will not work
 as is on your lineage file. For instance, it assumes that the lineage has two
-founder cells named specifically "AB" and "CD" (see around line 120). Each
+founder cells named specifically "AB" and "CD" (see write_mamut). Each
 founder cell will make a MaMuT track. If your lineage begins with four cells,
 you need to edit the code below to create four tracks.
 
@@ -74,68 +75,90 @@ def main():
     # Parse a Simi BioCell .sbd file.
     s = simi.SimiProject(args.sbc, args.sbd)
 
+    # Write the MaMuT XML file.
+    with open(args.out, 'w', buffering=simi.BUFFER_SIZE) as output:
+        write_mamut(s, output, args.z_calibration, interpolate=args.interpolate,
+                    fraction=args.fraction, frame_limit=args.frame_limit)
+
+
+def write_mamut(s, output, z_calibration, interpolate=False, fraction=1.0, frame_limit=None):
+    '''Write a Simi project as MaMuT XML to an open output file.
+
+    Nothing is written until the spots and edges of all cells are collected,
+    since the number of spots and their ids must be known first. The project
+    is not changed, so it can be written several times with different
+    parameters.
+    '''
+
     # Declare initial variables.
-    output = open(args.out, 'w')
     spot_id = 1
-    if args.frame_limit:
-        last_frame = int(args.frame_limit)
+    if frame_limit:
+        last_frame = int(frame_limit)
     else:
         last_frame = s.sbd.last_frame
 
-    # Lists aggregating spots and edges.
-    cell_edges = []
+    # Get lists of CD and AB descendants.
+    cd = s.sbd.cells['CD'].get_descendants()
+    ab = s.sbd.cells['AB'].get_descendants()
+
+    # Lists aggregating the exported cells of each track.
+    cd_cells = []
+    ab_cells = []
+
+    # First and last spot id, and spot edges, of each exported cell.
+    exported = {}
 
-    # Build template for spots per frame.
-    spots_per_frame = []
-    for f in range(0, last_frame + 1):
-        spots_per_frame.append([])
+    # Spots per frame, lists are only created for frames with spots.
+    spots_per_frame = defaultdict(list)
 
-    # Get calibration factor.
+    # Get calibration factors.
     calibration = s.sbd.get_calibration_factor()
+    z_calibration = float(z_calibration)
+    fraction = float(fraction)
 
     # Iterate through cells.
     for key, cell in s.sbd.valid_cells.items():
-        # Define a list of edges.
-        cell.spot_edges = []
-
-        # Get interpolated spots for every frame (best for MaMuT).
-        if args.interpolate:
-            all_spots = cell.interpolate_spots(float(args.fraction))
+        coordinates = list(cell.get_spot_coordinates())
+        cell_last_frame = cell.last_frame
+
+        # Get interpolated coordinates for every frame (best for MaMuT), as in
+        # Cell.interpolate_coordinates. The spot before division is computed
+        # once and extends the cell to a later frame.
+        if interpolate:
+            division = cell.get_division_coordinates()
+            if division is not None:
+                coordinates.append(division)
+                cell_last_frame = division[0]
+            if cell_last_frame > last_frame:
+                continue
+            coordinates = [item[1:] for item in
+                           simi.iter_interpolation(coordinates, fraction)]
         # Or not.
-        else:
-            all_spots = cell.spots
-
-        if cell.last_frame > last_frame:
+        elif cell_last_frame > last_frame:
             continue
 
-        # Iterate through cell interpolated spots.
-        for spot in all_spots:
-            # Define new id variable.
-            spot.id = spot_id
-            # Define new cell variable.
-            spot.cell = key
-            # Fix X value to MaMuT (based on CALIBRATION field of .sbc).
-            spot.x = spot.x * calibration
-            # Fix Y value to MaMuT.
-            spot.y = spot.y * calibration
-            # Fix Z value to MaMuT (multiply by 10).
-            spot.z = spot.z * float(args.z_calibration)
-            # Append spot to the list of his frame.
-            spots_per_frame[spot.frame].append(spot)
-            # Is this the first spot?
-            spot_index = all_spots.index(spot)
-            # If not, create an edge (first spot is skipped).
-            if spot_index != 0:
-                # Create an edge using the previous spot as source and current spot as target.
-                cell.spot_edges.append(edge_template.format(source_id=spot_id-1, target_id=spot_id))
-            # Increment unique spot id.
-            spot_id += 1
-        # Define cell's source_id == the id of the last spot.
-        cell.source_id = all_spots[-1].id
-        # Define cell's target_id == the id of the first spot.
-        cell.target_id = all_spots[0].id
-        # Append cells to generate cell edges.
-        cell_edges.append(cell)
+        # Allocate a range of unique spot ids for the cell.
+        first_id = spot_id
+        spot_id += len(coordinates)
+
+        # Iterate through cell coordinates. They are scaled into new tuples,
+        # the cell and its spots are left unchanged.
+        for new_id, (frame, x, y, z) in zip(range(first_id, spot_id), coordinates):
+            # Fix X and Y values to MaMuT (based on CALIBRATION field of .sbc)
+            # and Z with the z calibration, then append the spot to the list
+            # of its frame.
+            spots_per_frame[frame].append((new_id, key, frame, x * calibration, y * calibration, z * z_calibration))
+        # Create an edge from each spot to the next (ids are consecutive),
+        # kept as one string written with a single call.
+        spot_edges = ''.join([edge_template % (i, i + 1) for i in range(first_id, spot_id - 1)])
+        # Cell edges go from the last spot of the parent (source) to the first
+        # spot of the cell (target).
+        exported[cell] = (first_id, spot_id - 1, spot_edges)
+        # Append cell to its track to generate cell edges.
+        if cell.generic_name in cd:
+            cd_cells.append(cell)
+        if cell.generic_name in ab:
+            ab_cells.append(cell)
 
     # Begin XML file.
     output.write(begin_template)
@@ -143,15 +166,23 @@ def main():
     # Begin AllSpots.
     output.write(allspots_template.format(nspots=spot_id))
 
-    # Loop through lists of spots.
-    for frame, spots in enumerate(spots_per_frame):
+    # Loop through lists of spots. Runs of empty frames are collected and
+    # written together.
+    empty_frames = []
+    for frame in range(last_frame + 1):
+        spots = spots_per_frame.get(frame)
         if spots:
-            output.write(inframe_template.format(frame=frame))
-            for mamut_spot in spots:
-                output.write(spot_template.format(id=mamut_spot.id, name=mamut_spot.cell, frame=mamut_spot.frame, x=mamut_spot.x, y=mamut_spot.y, z=mamut_spot.z))
-            output.write(inframe_end_template)
+            if empty_frames:
+                output.writelines(empty_frames)
+                empty_frames = []
+            # Join the whole frame block and write it at once.
+            lines = [inframe_template.format(frame=frame)]
+            lines.extend([spot_template % (mamut_id, name, mamut_id, spot_frame, x, y, spot_frame, z) for mamut_id, name, spot_frame, x, y, z in spots])
+            lines.append(inframe_end_template)
+            output.write(''.join(lines))
         else:
-            output.write(inframe_empty_template.format(frame=frame))
+            empty_frames.append(inframe_empty_template.format(frame=frame))
+    output.writelines(empty_frames)
 
     # End AllSpots.
     output.write(allspots_end_template)
@@ -159,45 +190,9 @@ def main():
     # Begin AllTracks.
     output.write(alltracks_template)
 
-    # Begin Track.
-    output.write(track_template.format(id=1, duration=last_frame, stop=last_frame, nspots=spot_id))
-
-    # Get list of CD descendants.
-    cd = s.sbd.cells['CD'].get_descendants()
-
-    # Loop through cells printing cell and spot edges.
-    for cell in cell_edges:
-        if cell.generic_name in cd.keys():
-            if cell.parent:
-                try:
-                    output.write(edge_template.format(source_id=cell.parent.source_id, target_id=cell.target_id))
-                except:
-                    pass
-            for edge in cell.spot_edges:
-                output.write(edge)
-
-    # End Track.
-    output.write(track_end_template)
-
-    # Begin Track.
-    output.write(track_template.format(id=2, duration=last_frame, stop=last_frame, nspots=spot_id))
-
-    # Get list of AB descendants.
-    ab = s.sbd.cells['AB'].get_descendants()
-
-    # Loop through cells printing cell and spot edges.
-    for cell in cell_edges:
-        if cell.generic_name in ab.keys():
-            if cell.parent:
-                try:
-                    output.write(edge_template.format(source_id=cell.parent.source_id, target_id=cell.target_id))
-                except:
-                    pass
-            for edge in cell.spot_edges:
-                output.write(edge)
-
-    # End Track.
-    output.write(track_end_template)
+    # Write one track for CD cells and one for AB cells.
+    write_track(output, 1, cd_cells, exported, last_frame, spot_id)
+    write_track(output, 2, ab_cells, exported, last_frame, spot_id)
 
     # End AllTracks.
     output.write(alltracks_end_template)
@@ -207,11 +202,34 @@ def main():
 
     # Get some variables from the .sbc file.
     n_slices = s.sbc.settings['DISC']['LEVELCOUNT']
-    file_name = splitext(args.sbc)[0]
+    file_name = splitext(s.sbc.sbc_file.name)[0]
 
     # End XML file.
     output.write(end_template.format(filename=file_name, nslices=n_slices, nframes=last_frame))
 
 
+def write_track(output, track_id, cells, exported, last_frame, n_spots):
+    '''Write a MaMuT track with the cell and spot edges of cells.
+
+    exported maps each exported cell to its first and last spot id and its
+    spot edges (see write_mamut).
+    '''
+    # Begin Track.
+    output.write(track_template.format(id=track_id, duration=last_frame, stop=last_frame, nspots=n_spots))
+
+    # Loop through cells printing cell and spot edges.
+    for cell in cells:
+        first_id, last_id, spot_edges = exported[cell]
+        # Edge from the last spot of the parent. Parents that were not exported
+        # (invalid or beyond the frame limit) have no entry.
+        if cell.parent in exported:
+            parent_last_id = exported[cell.parent][1]
+            output.write(edge_template % (parent_last_id, first_id))
+        output.write(spot_edges)
+
+    # End Track.
+    output.write(track_end_template)
+
+
 if __name__ == '__main__':
     main()